@@ -1,77 +1,486 @@
 #!/usr/bin/env python3
 """FlakyFence - Test pollution bisection & shared state forensics engine."""
-import subprocess, sys, os, json, argparse
-from typing import List, Dict, Any, Callable
+import subprocess, sys, os, json, argparse, tempfile, ast, re
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Set, Tuple
+
+try:
+    import orjson
+    _loads = orjson.loads
+
+    def _dump(obj: Any, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+except ImportError:
+    _loads = json.loads
+
+    def _dump(obj: Any, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(obj, f, indent=2)
+
+# Every pytest runs with cwd=project: pinning rootdir there makes node IDs
+# relative to the project in every run. Config files are still searched for
+# upwards as usual.
+# The recorder plugin (entry point blocked so it is not registered twice)
+# and _plugin_env() are used for every run alike, so the suite, isolation
+# and bisection runs start from identical env vars and sys.modules.
+_PYTEST = (sys.executable, "-m", "pytest", "--rootdir=.",
+           "-p", "no:flakyfence", "-p", "flakyfence_plugin")
+_PYTEST_RUN_BASE = _PYTEST + ("-xvs", "--tb=no", "--no-header", "-p", "no:cacheprovider")
+_PYTEST_COLLECT_BASE = _PYTEST + ("--collect-only", "-q", "--no-header")
+_PYTEST_REPORT_BASE = _PYTEST + ("-p", "no:terminal", "-p", "no:cacheprovider")
+_PYTEST_RECORD_BASE = _PYTEST + ("-q", "--tb=no", "--no-header", "-p", "no:cacheprovider")
+
+
+class PytestError(RuntimeError):
+    """pytest could not run the requested tests at all."""
+
+
+_MISSING = object()
+_HAS_ENVIRONB = hasattr(os, "environb")   # False on Windows
+
+
+def _decode(v: Any) -> str:
+    return os.fsdecode(v) if isinstance(v, bytes) else v
 
 
 class StateSnapshot:
     """Capture process-level shared state for forensic diffing."""
 
     def __init__(self):
-        self.env = dict(os.environ)
-        self.modules = set(sys.modules.keys())
+        # environb skips the per-entry fsdecode; values are decoded in diff.
+        self.env = dict(os.environb) if _HAS_ENVIRONB else dict(os.environ)
+        # A tuple of the (interned) names is far cheaper than a set; the
+        # set is only built when a diff or caller actually needs it.
+        self._modules_tuple = tuple(sys.modules)
+        self._modules = None
+
+    @property
+    def modules(self) -> Set[str]:
+        if self._modules is None:
+            self._modules = set(self._modules_tuple)
+        return self._modules
+
+    def _unchanged(self, after: "StateSnapshot") -> bool:
+        # Both comparisons run in C. A materialised modules set may have been
+        # edited, so only the captured tuples are trusted.
+        return (self._modules is None and after._modules is None
+                and self._modules_tuple == after._modules_tuple
+                and self.env == after.env)
+
+    def _module_names(self) -> Iterable[str]:
+        return self._modules_tuple if self._modules is None else self._modules
 
     def diff(self, after: "StateSnapshot") -> List[Dict[str, str]]:
+        if self is after or self._unchanged(after):
+            return []
         changes = []
-        for k in set(after.env) - set(self.env):
-            changes.append({"type": "env_added", "key": k, "value": after.env[k]})
-        for k in set(self.env) - set(after.env):
-            changes.append({"type": "env_removed", "key": k})
-        for k in set(self.env) & set(after.env):
-            if self.env[k] != after.env[k]:
-                changes.append({"type": "env_changed", "key": k, "old": self.env[k], "new": after.env[k]})
-        for m in after.modules - self.modules:
+        for k, v in after.env.items():
+            old = self.env.get(k, _MISSING)
+            if old is _MISSING:
+                changes.append({"type": "env_added", "key": _decode(k), "value": _decode(v)})
+            elif old != v:
+                changes.append({"type": "env_changed", "key": _decode(k),
+                                "old": _decode(old), "new": _decode(v)})
+        for k in self.env.keys() - after.env.keys():
+            changes.append({"type": "env_removed", "key": _decode(k)})
+        for m in after.modules.difference(self._module_names()):
             changes.append({"type": "module_added", "module": m})
         return changes
 
 
 def bisect_polluter(victim: str, suspects: List[str], runner: Callable = None,
-                    project: str = ".") -> List[str]:
-    """Delta-debug: find minimal set of tests that pollute victim."""
+                    project: str = ".", parallel: bool = False,
+                    executor: Executor = None) -> List[str]:
+    """Delta-debug (Zeller's ddmin): find a 1-minimal set of tests that pollute victim.
+
+    With ``parallel=True`` the candidate subsets of each round are run
+    concurrently, capped at ``os.cpu_count()`` pytest processes. Passing an
+    ``executor`` runs them on that pool instead, so it can be shared.
+    """
     if runner is None:
-        runner = lambda tests: run_sequence(tests + [victim], project)
-    if len(suspects) <= 1:
-        return suspects
-    mid = len(suspects) // 2
-    left, right = suspects[:mid], suspects[mid:]
-    if not runner(left):
-        return bisect_polluter(victim, left, runner)
-    if not runner(right):
-        return bisect_polluter(victim, right, runner)
+        runner = _cached_runner(victim, project, {t: i for i, t in enumerate(suspects)})
+    runner = _memoized(runner, suspects)
+    if executor is not None or not parallel:
+        return _ddmin(suspects, runner, executor)
+    with _worker_pool() as pool:
+        return _ddmin(suspects, runner, pool)
+
+
+def _memoized(runner: Callable, failing: List[str]) -> Callable:
+    """Never run the same subset twice; ``failing`` is known to fail already."""
+    memo = {tuple(failing): False}
+
+    def run(tests: List[str]) -> bool:
+        key = tuple(tests)
+        if key not in memo:
+            memo[key] = runner(tests)
+        return memo[key]
+    return run
+
+
+def _worker_pool() -> Executor:
+    # Workers only wait on pytest subprocesses, so threads are enough.
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+
+def _ddmin(suspects: List[str], runner: Callable, pool) -> List[str]:
+    n = 2
+    while len(suspects) > 1:
+        size = len(suspects)
+        n = min(n, size)
+        cuts = [i * size // n for i in range(n + 1)]
+        chunks = [suspects[cuts[i]:cuts[i + 1]] for i in range(n)]
+        subset = _first_failing(chunks, runner, pool)
+        if subset is not None:
+            # Resume at the current granularity instead of restarting at n=2.
+            suspects = subset
+            continue
+        if n > 2:   # for n == 2 the complements are the chunks themselves
+            complements = [suspects[:cuts[i]] + suspects[cuts[i + 1]:] for i in range(n)]
+            complement = _first_failing(complements, runner, pool)
+            if complement is not None:
+                suspects, n = complement, max(n - 1, 2)
+                continue
+        if n == size:
+            break
+        n = min(2 * n, size)
     return suspects
 
 
+def _first_failing(candidates: List[List[str]], runner: Callable, pool) -> List[str]:
+    """Return the first candidate the runner fails on, or None."""
+    # builtin map is lazy, so the serial path stops at the first failure;
+    # the pool speculatively runs every candidate at once.
+    outcomes = pool.map(runner, candidates) if pool else map(runner, candidates)
+    for candidate, ok in zip(candidates, outcomes):
+        if not ok:
+            return candidate
+    return None
+
+
+_run_cache: Dict[tuple, bool] = {}
+
+
+def _cached_runner(victim: str, project: str, order: Dict[str, int]) -> Callable:
+    """Wrap run_sequence so each (sequence, victim, project) runs only once.
+
+    Sequences are keyed in canonical suite order (``order`` maps node ID to
+    position), so subsets assembled in a different order share an entry.
+    That is sound because runners are only ever given subsets in suite order.
+    """
+    root = os.path.abspath(project)
+
+    def runner(tests: List[str]) -> bool:
+        key = (tuple(sorted(dict.fromkeys(tests), key=order.__getitem__)), victim, root)
+        if key not in _run_cache:
+            _run_cache[key] = run_sequence(tests + [victim], project)
+        return _run_cache[key]
+    return runner
+
+
 def run_sequence(tests: List[str], project: str = ".") -> bool:
     """Run tests in given order, return True if all pass."""
     if not tests:
         return True
-    cmd = [sys.executable, "-m", "pytest", "-xvs", "--tb=no",
-           "--no-header", "-p", "no:cacheprovider"] + tests
-    r = subprocess.run(cmd, capture_output=True, text=True, cwd=project)
+    r = subprocess.run((*_PYTEST_RUN_BASE, *tests), stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, cwd=project, env=_plugin_env())
     return r.returncode == 0
 
 
-def collect_tests(path: str = ".") -> List[str]:
-    """Collect test node IDs via pytest."""
-    cmd = [sys.executable, "-m", "pytest", "--collect-only", "-q", "--no-header", path]
-    r = subprocess.run(cmd, capture_output=True, text=True, cwd=path)
-    return [line.strip() for line in r.stdout.splitlines() if "::" in line]
+_collect_cache: Dict[tuple, List[str]] = {}
+_CONFIG_FILES = ("pyproject.toml", "pytest.ini", "setup.cfg", "tox.ini")
+# pytest's default norecursedirs (plus ".*" and "*.egg", checked separately).
+_SKIP_DIRS = {"build", "dist", "_darcs", "CVS", "{arch}", "venv", "node_modules",
+              "__pycache__", "site-packages"}
+# Options the static scan cannot honour; any of them means pytest collects.
+_COLLECTION_OPTIONS = re.compile(
+    r"^\s*(testpaths|norecursedirs|python_files|python_classes|python_functions)\s*=", re.M)
+_COLLECT_CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "flakyfence", "collect.json")
+
+
+def collect_tests(path: str = ".", fast: bool = False) -> List[str]:
+    """Collect test node IDs via pytest, or with a static ast scan when ``fast``.
+
+    The static scan is a heuristic that follows pytest's default collection
+    rules only, so pytest's own collection is still used when the project's
+    config changes them or when the scan finds nothing.
+    """
+    if fast and not _custom_collection(path):
+        test_ids = _fast_collect(path)
+        if test_ids:
+            return test_ids
+    root = os.path.abspath(path)
+    key = (root,) + tuple(os.path.getmtime(os.path.join(root, name))
+                          if os.path.exists(os.path.join(root, name)) else None
+                          for name in _CONFIG_FILES)
+    if key not in _collect_cache:
+        r = subprocess.run((*_PYTEST_COLLECT_BASE, "."), capture_output=True, text=True,
+                           cwd=path, env=_plugin_env())
+        _collect_cache[key] = [line.strip() for line in r.stdout.splitlines() if "::" in line]
+    return list(_collect_cache[key])
+
+
+def _custom_collection(path: str) -> bool:
+    for name in _CONFIG_FILES:
+        try:
+            with open(os.path.join(path, name)) as f:
+                if _COLLECTION_OPTIONS.search(f.read()):
+                    return True
+        except (OSError, UnicodeDecodeError):
+            continue
+    return False
+
 
+def _fast_collect(path: str) -> List[str]:
+    """Find test functions and Test* methods by parsing test files with ast.
 
-def find_victims(test_ids: List[str], project: str = ".") -> List[str]:
-    """Find tests that fail in suite but pass in isolation."""
-    cmd = [sys.executable, "-m", "pytest", "-v", "--tb=no", "--no-header",
-           "-p", "no:cacheprovider"] + test_ids
-    r = subprocess.run(cmd, capture_output=True, text=True, cwd=project)
-    if r.returncode == 0:
+    Parsed names are cached on disk per file, keyed by mtime.
+    """
+    root = os.path.abspath(path)
+    try:
+        with open(_COLLECT_CACHE_FILE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    test_ids, dirty = [], False
+    for entry in _test_files(root):
+        mtime = entry.stat().st_mtime
+        cached = cache.get(entry.path)
+        if cached is None or cached[0] != mtime:
+            cached = cache[entry.path] = [mtime, _test_names(entry.path)]
+            dirty = True
+        rel = os.path.relpath(entry.path, root).replace(os.sep, "/")
+        test_ids.extend(f"{rel}::{name}" for name in cached[1])
+    if dirty:
+        try:
+            os.makedirs(os.path.dirname(_COLLECT_CACHE_FILE), exist_ok=True)
+            tmp = f"{_COLLECT_CACHE_FILE}.{os.getpid()}"
+            with open(tmp, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp, _COLLECT_CACHE_FILE)
+        except OSError:
+            pass
+    return test_ids
+
+
+def _test_files(directory: str) -> Iterable[os.DirEntry]:
+    # Name-sorted with files and directories interleaved, like pytest.
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if not (entry.name.startswith(".") or entry.name.endswith(".egg")
+                    or entry.name in _SKIP_DIRS):
+                yield from _test_files(entry.path)
+        elif entry.name.endswith(".py") and (entry.name.startswith("test_")
+                                             or entry.name.endswith("_test.py")):
+            yield entry
+
+
+def _test_names(file: str) -> List[str]:
+    """Top-level test functions and methods of collectable Test* classes.
+
+    unittest.TestCase subclasses not named Test*, inherited methods and
+    nested classes are not seen; use pytest collection for those.
+    """
+    try:
+        with open(file, "rb") as f:
+            tree = ast.parse(f.read(), file)
+    except (OSError, SyntaxError, ValueError):
         return []
-    victims = []
-    for line in r.stdout.splitlines():
-        if " FAILED" in line:
-            tid = line.split(" ")[0].strip()
-            if tid and run_sequence([tid], project):
-                victims.append(tid)
-    return victims
+    funcs = (ast.FunctionDef, ast.AsyncFunctionDef)
+    names = []
+    for node in tree.body:
+        if isinstance(node, funcs) and node.name.startswith("test") and not _is_fixture(node):
+            names.append(node.name)
+        elif (isinstance(node, ast.ClassDef) and node.name.startswith("Test")
+              and _collectable_class(node)):
+            names.extend(f"{node.name}::{m.name}" for m in node.body
+                         if isinstance(m, funcs) and m.name.startswith("test")
+                         and not _is_fixture(m))
+    return names
+
+
+def _is_fixture(node: ast.AST) -> bool:
+    for deco in node.decorator_list:
+        target = deco.func if isinstance(deco, ast.Call) else deco
+        name = target.attr if isinstance(target, ast.Attribute) else getattr(target, "id", None)
+        if name == "fixture":
+            return True
+    return False
+
+
+def _collectable_class(node: ast.ClassDef) -> bool:
+    # pytest skips classes with an __init__ and those marked __test__ = False.
+    for stmt in node.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)) and stmt.name == "__init__":
+            return False
+        if (isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Constant)
+                and not stmt.value.value
+                and any(isinstance(t, ast.Name) and t.id == "__test__" for t in stmt.targets)):
+            return False
+    return True
+
+
+_suite_cache: Dict[tuple, Tuple[List[str], Dict[str, List[Dict]], List[str]]] = {}
+
+
+def find_victims(test_ids: List[str], project: str = ".", early_cutoff: int = 0) -> List[str]:
+    """Find tests that fail in suite but pass in isolation.
+
+    With ``early_cutoff`` the suite run stops early once enough failures
+    have been seen to confirm that many victims.
+    """
+    return list(_suite_run(test_ids, project, early_cutoff)[0])
+
+
+def _suite_run(test_ids: List[str], project: str,
+               early_cutoff: int) -> Tuple[List[str], Dict[str, List[Dict]], List[str]]:
+    """Run the suite under the state recorder.
+
+    Returns the victims, each test's state changes and the node IDs pytest
+    actually ran, in order.
+
+    With ``early_cutoff`` the suite is stopped after that many failures,
+    which are isolated once it has exited. If too few of them are victims,
+    the suite is rerun with twice the failure budget until enough victims
+    are confirmed or it runs to completion.
+    """
+    key = (os.path.abspath(project), tuple(test_ids), early_cutoff)
+    if key in _suite_cache:
+        return _suite_cache[key]
+    isolated: Dict[str, str] = {}
+    budget = early_cutoff
+    while True:
+        seen = []
+        outcomes, changes = _recorded_run(
+            test_ids, project,
+            (lambda tid: seen.append(tid) or len(seen) == budget) if budget else None)
+        failed = [tid for tid, outcome in outcomes.items() if outcome == "failed"]
+        # Isolate with one session per module, so import-time side effects of
+        # other failing modules cannot leak in.
+        by_module: Dict[str, List[str]] = {}
+        for tid in failed:
+            if tid not in isolated:
+                by_module.setdefault(tid.split("::", 1)[0], []).append(tid)
+        for tids in by_module.values():
+            isolated.update(_isolated(tids, project))
+        victims = [tid for tid in failed if isolated.get(tid) == "passed"]
+        # Fewer failures than the budget means the suite ran to the end.
+        if not budget or len(victims) >= early_cutoff or len(failed) < budget:
+            break
+        budget *= 2
+    _suite_cache[key] = victims, changes, list(outcomes)
+    return _suite_cache[key]
+
+
+def _recorded_run(test_ids: List[str], project: str,
+                  on_failure: Callable[[str], bool]) -> Tuple[Dict[str, str], Dict[str, List[Dict]]]:
+    fd, log = tempfile.mkstemp(prefix="flakyfence-", suffix=".jsonl")
+    os.close(fd)
+    try:
+        outcomes = _report_outcomes([f"--flakyfence-state-log={log}", *test_ids],
+                                    project, on_failure)
+        return outcomes, _read_state_log(log)
+    finally:
+        os.unlink(log)
+
+
+def _isolated(tids: List[str], project: str) -> Dict[str, str]:
+    # pytest-forked gives each test its own fork instead of a new interpreter.
+    return _report_outcomes(["--forked"] + tids, project)
+
+
+def _report_outcomes(args: List[str], project: str,
+                     on_failure: Callable[[str], bool] = None) -> Dict[str, str]:
+    """Run pytest with a streamed report log and map each node ID to its call outcome.
+
+    Node IDs appear in the order pytest ran them. Setup or teardown failures
+    are reported as ``"error"``, mirroring the FAILED/ERROR split of the
+    terminal summary. ``on_failure`` is called with each failed node ID as it
+    is reported; returning True terminates the run.
+    """
+    # The log is written to a pipe inherited by pytest, so events are
+    # parsed while the suite is still running.
+    read_fd, write_fd = os.pipe()
+    cmd = (*_PYTEST_REPORT_BASE, f"--report-log=/dev/fd/{write_fd}", *args)
+    outcomes, terminated = {}, False
+    with tempfile.TemporaryFile() as err:
+        with subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=err,
+                              cwd=project, env=_plugin_env(), pass_fds=(write_fd,)) as proc:
+            os.close(write_fd)
+            with os.fdopen(read_fd, "rb") as log:
+                for line in log:
+                    event = _loads(line)
+                    if event.get("$report_type") != "TestReport":
+                        continue
+                    nodeid, outcome = event["nodeid"], event["outcome"]
+                    if event["when"] == "call":
+                        outcomes[nodeid] = outcome
+                        if outcome == "failed" and on_failure is not None and on_failure(nodeid):
+                            proc.terminate()
+                            terminated = True
+                            break
+                    elif outcome == "failed":
+                        if outcomes.get(nodeid) != "failed":
+                            outcomes[nodeid] = "error"
+                    else:
+                        # Setup inserts the entry, so keys are in execution order.
+                        outcomes.setdefault(nodeid, outcome)
+        # 0 and 1 mean the tests ran; anything else (no tests collected,
+        # usage or internal errors, missing plugins) means they did not.
+        if not terminated and proc.returncode not in (0, 1):
+            err.seek(0)
+            lines = err.read().decode(errors="replace").strip().splitlines()
+            raise PytestError(f"pytest exited with code {proc.returncode}"
+                              + (": " + " ".join(lines[-2:]) if lines else ""))
+    return outcomes
+
+
+def record_state_changes(test_ids: List[str], project: str = ".") -> Dict[str, List[Dict]]:
+    """Run tests once under flakyfence_plugin and return each test's state changes."""
+    fd, log = tempfile.mkstemp(prefix="flakyfence-", suffix=".jsonl")
+    os.close(fd)
+    cmd = (*_PYTEST_RECORD_BASE, f"--flakyfence-state-log={log}", *test_ids)
+    try:
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       cwd=project, env=_plugin_env())
+        return _read_state_log(log)
+    finally:
+        os.unlink(log)
+
+
+def _plugin_env() -> Dict[str, str]:
+    # Make the plugin importable when running from a source checkout.
+    here = os.path.dirname(os.path.abspath(__file__))
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [here, os.environ.get("PYTHONPATH")])))
+
+
+def _read_state_log(path: str) -> Dict[str, List[Dict]]:
+    changes = {}
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    entry = _loads(line)
+                except ValueError:   # cut short when the run was terminated
+                    break
+                changes[entry["nodeid"]] = entry["changes"]
+    except OSError:
+        pass
+    return changes
+
+
+def prefilter_suspects(suspects: List[str], changes: Dict[str, List[Dict]]) -> List[str]:
+    """Drop suspects that provably left shared state untouched.
+
+    Tests missing from ``changes`` (e.g. they crashed in teardown) are kept.
+    """
+    return [t for t in suspects if changes.get(t, True)]
 
 
 def to_sarif(results: List[Dict]) -> Dict[str, Any]:
@@ -83,24 +492,41 @@ def to_sarif(results: List[Dict]) -> Dict[str, Any]:
             "rules": [{"id": "test-pollution",
                        "shortDescription": {"text": "Test pollution detected"}}]}},
             "results": [{"ruleId": "test-pollution", "level": "error",
-                "message": {"text": f"{r['victim']} polluted by {r['polluters']}"},
+                "message": {"text": r["victim"] + " polluted by " + ", ".join(r["polluters"])},
                 "properties": {"stateChanges": r.get("state_changes", [])}}
                 for r in results]}]
     }
 
 
-def analyze(test_ids: List[str], project: str = ".", limit: int = 3) -> List[Dict]:
+def analyze(test_ids: List[str], project: str = ".", limit: int = 3,
+            parallel: bool = False) -> List[Dict]:
     """Full pipeline: find victims, bisect polluters, collect state diffs."""
-    victims = find_victims(test_ids, project)
+    # One victim past the limit is enough to know the limit was exceeded.
+    victims, changes, executed = _suite_run(test_ids, project, limit + 1 if limit > 0 else 0)
     results = []
-    for i, victim in enumerate(victims):
-        if 0 < limit <= i:
-            print(f"\u26a0\ufe0f  Free tier limit ({limit}). Upgrade: flakyfence.dev/pro")
-            break
-        idx = test_ids.index(victim) if victim in test_ids else len(test_ids)
-        suspects = [t for t in test_ids[:idx] if t != victim]
-        polluters = bisect_polluter(victim, suspects, project=project)
-        results.append({"victim": victim, "polluters": polluters, "state_changes": []})
+    # Suspects are taken from the node IDs pytest actually ran, so file
+    # arguments and parametrized cases are addressed exactly like the victim
+    # and the recorded state changes.
+    pos = {t: i for i, t in enumerate(executed)}
+    # One pool for the whole analysis rather than one per victim.
+    pool = _worker_pool() if parallel and victims else None
+    try:
+        for i, victim in enumerate(victims):
+            if 0 < limit <= i:
+                print(f"\u26a0\ufe0f  Free tier limit ({limit}). Upgrade: flakyfence.dev/pro")
+                break
+            suspects = executed[:pos.get(victim, len(executed))]
+            narrowed = prefilter_suspects(suspects, changes)
+            # The recorder only sees env vars and modules; if those tests alone
+            # do not break the victim, fall back to the full prefix.
+            if narrowed != suspects and narrowed and not _cached_runner(victim, project, pos)(narrowed):
+                suspects = narrowed
+            polluters = bisect_polluter(victim, suspects, project=project, executor=pool)
+            state = [c for t in polluters for c in changes.get(t, [])]
+            results.append({"victim": victim, "polluters": polluters, "state_changes": state})
+    finally:
+        if pool is not None:
+            pool.shutdown()
     return results
 
 
@@ -113,15 +539,22 @@ def main():
     p.add_argument("--json-output", action="store_true", help="JSON stdout")
     p.add_argument("--limit", type=int, default=3,
                    help="Max victims to analyze (0=unlimited, free=3)")
+    p.add_argument("--parallel", action="store_true",
+                   help="Run bisection steps concurrently (one pytest per core)")
+    p.add_argument("--fast-collection", action="store_true",
+                   help="Collect tests with a static scan instead of pytest (default layouts only)")
     args = p.parse_args()
-    test_ids = args.tests or collect_tests(args.project)
+    test_ids = args.tests or collect_tests(args.project, args.fast_collection)
     if not test_ids:
         print("No tests found."); return 0
     print(f"\U0001f52c FlakyFence analyzing {len(test_ids)} tests...")
-    results = analyze(test_ids, args.project, args.limit)
+    try:
+        results = analyze(test_ids, args.project, args.limit, args.parallel)
+    except PytestError as e:
+        print(f"\u274c {e}", file=sys.stderr)
+        return 2
     if args.sarif:
-        with open(args.sarif, "w") as f:
-            json.dump(to_sarif(results), f, indent=2)
+        _dump(to_sarif(results), args.sarif)
         print(f"\U0001f4c4 SARIF \u2192 {args.sarif}")
     elif args.json_output:
         print(json.dumps(results, indent=2))
@@ -0,0 +1,45 @@
+"""FlakyFence pytest plugin - record shared state changes per test."""
+import json
+import pytest
+from flakyfence import StateSnapshot
+
+# Set by pytest itself around every phase, never a sign of pollution.
+_IGNORED_KEYS = {"PYTEST_CURRENT_TEST"}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--flakyfence-state-log", metavar="PATH", default=None,
+                     help="Append each test's shared state changes to PATH as JSON lines")
+
+
+def pytest_configure(config):
+    path = config.getoption("flakyfence_state_log")
+    if path:
+        config.pluginmanager.register(StateRecorder(path), "flakyfence-recorder")
+
+
+class StateRecorder:
+    """Snapshot state around each test, from setup start to teardown end.
+
+    One line is written per test as it finishes, so a run that is stopped
+    early still leaves a usable log.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", buffering=1)
+        self._before = {}
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item):
+        self._before[item.nodeid] = StateSnapshot()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_runtest_teardown(self, item):
+        before = self._before.pop(item.nodeid, None)
+        if before is not None:
+            changes = [c for c in before.diff(StateSnapshot())
+                       if c.get("key") not in _IGNORED_KEYS]
+            self._file.write(json.dumps({"nodeid": item.nodeid, "changes": changes}) + "\n")
+
+    def pytest_unconfigure(self):
+        self._file.close()
@@ -12,7 +12,7 @@ setup(
         "pytest11": ["flakyfence = flakyfence_plugin"],
     },
 
-    install_requires=["pytest>=7.0"],
+    install_requires=["pytest>=7.0", "pytest-forked>=1.3", "pytest-reportlog>=0.4"],
     python_requires=">=3.8",
     author="FlakyFence",
     url="https://github.com/flakyfence/flakyfence",
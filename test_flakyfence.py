@@ -1,6 +1,8 @@
 """Tests for FlakyFence core engine."""
 import os, sys, json
-from flakyfence import StateSnapshot, bisect_polluter, to_sarif
+import pytest
+from flakyfence import (StateSnapshot, bisect_polluter, collect_tests, find_victims,
+                        prefilter_suspects, record_state_changes, to_sarif)
 
 
 def test_snapshot_detects_env_addition():
@@ -50,6 +52,14 @@ def test_snapshot_detects_module_leak():
     assert mods[0]["type"] == "module_added"
 
 
+def test_snapshot_reports_env_as_str():
+    before = StateSnapshot()
+    os.environ["_FF_STR"] = "caf\u00e9"
+    after = StateSnapshot()
+    del os.environ["_FF_STR"]
+    assert before.diff(after) == [{"type": "env_added", "key": "_FF_STR", "value": "caf\u00e9"}]
+
+
 def test_snapshot_no_changes():
     snap = StateSnapshot()
     assert snap.diff(snap) == []
@@ -78,6 +88,21 @@ def test_bisect_needs_both_halves():
     assert set(result) == {"a", "b"}
 
 
+def test_bisect_finds_polluter_pair_in_large_list():
+    suspects = [f"t{i}" for i in range(8)]
+    runner = lambda tests: not ("t1" in tests and "t6" in tests)
+    result = bisect_polluter("victim", suspects, runner=runner)
+    assert result == ["t1", "t6"]
+
+
+def test_bisect_never_reruns_a_subset():
+    calls = []
+    runner = lambda tests: calls.append(tuple(tests)) or not ("t0" in tests and "t15" in tests)
+    result = bisect_polluter("victim", [f"t{i}" for i in range(16)], runner=runner)
+    assert result == ["t0", "t15"]
+    assert len(calls) == len(set(calls))
+
+
 def test_bisect_polluter_at_end_of_large_list():
     suspects = [f"t{i}" for i in range(16)]
     runner = lambda tests: "t14" not in tests
@@ -85,6 +110,176 @@ def test_bisect_polluter_at_end_of_large_list():
     assert result == ["t14"]
 
 
+def test_prefilter_keeps_only_state_mutators():
+    changes = {"a": [], "b": [{"type": "env_added", "key": "X", "value": "1"}]}
+    assert prefilter_suspects(["a", "b", "unknown"], changes) == ["b", "unknown"]
+
+
+def test_record_state_changes_per_test(tmp_path):
+    (tmp_path / "test_mod.py").write_text(
+        "import os\n"
+        "def test_clean(): pass\n"
+        "def test_dirty(): os.environ['_FF_PLUGIN_DIRTY'] = '1'\n")
+    changes = record_state_changes(["test_mod.py::test_clean", "test_mod.py::test_dirty"],
+                                   str(tmp_path))
+    assert changes["test_mod.py::test_clean"] == []
+    assert changes["test_mod.py::test_dirty"] == [
+        {"type": "env_added", "key": "_FF_PLUGIN_DIRTY", "value": "1"}]
+
+
+def test_find_victims_isolates_per_module_and_caches_result(monkeypatch):
+    import flakyfence
+    calls = []
+
+    def fake_outcomes(args, project, on_failure=None):
+        calls.append(args)
+        if args[0] != "--forked":
+            return {"a.py::t1": "failed", "b.py::t2": "failed", "a.py::t3": "failed",
+                    "b.py::t4": "passed"}
+        return {tid: "passed" for tid in args[1:] if tid != "a.py::t3"}
+    monkeypatch.setattr(flakyfence, "_suite_cache", {})
+    monkeypatch.setattr(flakyfence, "_report_outcomes", fake_outcomes)
+    suite = ["a.py::t1", "b.py::t2", "a.py::t3", "b.py::t4"]
+    assert find_victims(suite) == ["a.py::t1", "b.py::t2"]
+    assert calls[1:] == [["--forked", "a.py::t1", "a.py::t3"], ["--forked", "b.py::t2"]]
+    find_victims(suite)
+    assert len(calls) == 3
+
+
+def test_report_outcomes_from_real_pytest(tmp_path):
+    from flakyfence import _report_outcomes
+    (tmp_path / "test_mod.py").write_text(
+        "import pytest\n"
+        "@pytest.fixture\n"
+        "def broken(): raise RuntimeError\n"
+        "def test_pass(): pass\n"
+        "def test_fail(): assert False\n"
+        "def test_error(broken): pass\n"
+        "def test_after(): pass\n")
+    outcomes = _report_outcomes(["test_mod.py"], str(tmp_path))
+    assert outcomes == {"test_mod.py::test_pass": "passed", "test_mod.py::test_fail": "failed",
+                        "test_mod.py::test_error": "error", "test_mod.py::test_after": "passed"}
+    stopped = _report_outcomes(["test_mod.py"], str(tmp_path), on_failure=lambda tid: True)
+    assert "test_mod.py::test_after" not in stopped
+
+
+def test_report_outcomes_raises_when_pytest_cannot_run(tmp_path):
+    from flakyfence import PytestError, _report_outcomes
+    (tmp_path / "test_mod.py").write_text("def test_pass(): pass\n")
+    with pytest.raises(PytestError, match="code 4"):
+        _report_outcomes(["test_mod.py::test_missing"], str(tmp_path))
+    with pytest.raises(PytestError, match="code 5"):
+        _report_outcomes(["-k", "nothing_matches"], str(tmp_path))
+
+
+def test_suite_and_isolation_runs_share_env_and_modules(tmp_path, monkeypatch):
+    import flakyfence
+    monkeypatch.setattr(flakyfence, "_suite_cache", {})
+    (tmp_path / "test_m.py").write_text(
+        "import os, sys\n"
+        "def test_clean(): pass\n"
+        "def test_env_is_pristine(): assert 'PYTHONPATH' not in os.environ\n"
+        "def test_modules_are_pristine(): assert 'flakyfence' not in sys.modules\n")
+    suite = ["test_m.py::test_clean", "test_m.py::test_env_is_pristine",
+             "test_m.py::test_modules_are_pristine"]
+    assert find_victims(suite, str(tmp_path)) == []
+    assert find_victims(suite, str(tmp_path), early_cutoff=4) == []
+
+
+def test_find_victims_isolates_after_the_suite_exits(tmp_path, monkeypatch):
+    import flakyfence
+    monkeypatch.setattr(flakyfence, "_suite_cache", {})
+    (tmp_path / "test_lock.py").write_text(
+        "import os, time\n"
+        "LOCK = 'port.lock'\n"
+        "def hold(seconds=0):\n"
+        "    os.close(os.open(LOCK, os.O_CREAT | os.O_EXCL))\n"
+        "    time.sleep(seconds)\n"
+        "    os.unlink(LOCK)\n"
+        "def test_polluter(): os.environ['_FF_LOCK'] = '1'\n"
+        "def test_victim():\n"
+        "    hold()\n"
+        "    assert '_FF_LOCK' not in os.environ\n"
+        "def test_later(): hold(1)\n")
+    suite = ["test_lock.py::test_polluter", "test_lock.py::test_victim", "test_lock.py::test_later"]
+    assert find_victims(suite, str(tmp_path), early_cutoff=4) == ["test_lock.py::test_victim"]
+
+
+def test_find_victims_cutoff_skips_broken_tests(tmp_path, monkeypatch):
+    import flakyfence
+    monkeypatch.setattr(flakyfence, "_suite_cache", {})
+    (tmp_path / "test_0.py").write_text(
+        "".join(f"def test_broken{i}(): assert False\n" for i in range(4)))
+    (tmp_path / "test_1.py").write_text(
+        "import os\n"
+        "def test_polluter(): os.environ['_FF_CUTOFF'] = '1'\n"
+        "def test_victim(): assert '_FF_CUTOFF' not in os.environ\n")
+    suite = [f"test_0.py::test_broken{i}" for i in range(4)]
+    suite += ["test_1.py::test_polluter", "test_1.py::test_victim"]
+    assert find_victims(suite, str(tmp_path), early_cutoff=1) == ["test_1.py::test_victim"]
+    # The state recorder rode along in the same, early-terminated suite run.
+    _, changes, _ = flakyfence._suite_run(suite, str(tmp_path), 1)
+    assert changes["test_1.py::test_polluter"] == [
+        {"type": "env_added", "key": "_FF_CUTOFF", "value": "1"}]
+    assert find_victims(suite, str(tmp_path)) == ["test_1.py::test_victim"]
+
+
+def test_fast_collect_matches_pytest_collection(tmp_path, monkeypatch):
+    import flakyfence
+    monkeypatch.setattr(flakyfence, "_COLLECT_CACHE_FILE", str(tmp_path / "cache.json"))
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "test_b.py").write_text(
+        "def test_one(): pass\n"
+        "def helper(): pass\n"
+        "class TestThing:\n"
+        "    def test_method(self): pass\n"
+        "    def setup_method(self): pass\n")
+    (tmp_path / "a_test.py").write_text(
+        "import pytest\n"
+        "@pytest.fixture\n"
+        "def test_data(): return 1\n"
+        "def test_suffix(test_data): pass\n"
+        "class TestWithInit:\n"
+        "    def __init__(self): pass\n"
+        "    def test_skipped(self): pass\n"
+        "class TestDisabled:\n"
+        "    __test__ = False\n"
+        "    def test_skipped(self): pass\n")
+    (tmp_path / "conftest.py").write_text("def test_not_collected(): pass\n")
+    for skipped in (".venv", "build", "dist", "pkg.egg"):
+        (tmp_path / skipped).mkdir()
+        (tmp_path / skipped / "test_copy.py").write_text("def test_x(): pass\n")
+    expected = ["a_test.py::test_suffix", "pkg/test_b.py::test_one",
+                "pkg/test_b.py::TestThing::test_method"]
+    assert collect_tests(str(tmp_path), fast=True) == expected
+    assert collect_tests(str(tmp_path), fast=True) == expected   # served from the cache
+    assert str(tmp_path / "a_test.py") in json.load(open(tmp_path / "cache.json"))
+    (tmp_path / "cache.json").unlink()
+    assert collect_tests(str(tmp_path)) == expected
+
+
+def test_collect_uses_pytest_for_custom_collection_config(tmp_path, monkeypatch):
+    import flakyfence
+    monkeypatch.setattr(flakyfence, "_COLLECT_CACHE_FILE", str(tmp_path / "cache.json"))
+    (tmp_path / "pytest.ini").write_text("[pytest]\npython_files = check_*.py\n")
+    (tmp_path / "check_mod.py").write_text("def test_one(): pass\n")
+    (tmp_path / "test_ignored.py").write_text("def test_two(): pass\n")
+    assert collect_tests(str(tmp_path), fast=True) == ["check_mod.py::test_one"]
+
+
+def test_analyze_takes_suspects_from_executed_ids(monkeypatch):
+    import flakyfence
+    seen = []
+    executed = ["test_0.py::test_p1", "test_p.py::test_p[1]", "test_p.py::test_p[2]",
+                "test_b.py::test_later_polluter"]
+    monkeypatch.setattr(flakyfence, "_suite_run",
+                        lambda ids, project, cutoff: (["test_p.py::test_p[2]"], {}, executed))
+    monkeypatch.setattr(flakyfence, "bisect_polluter",
+                        lambda victim, suspects, **kw: seen.append(suspects) or suspects)
+    flakyfence.analyze(["test_0.py", "test_p.py::test_p", "test_b.py"])
+    assert seen == [["test_0.py::test_p1", "test_p.py::test_p[1]"]]
+
+
 def test_sarif_valid_structure():
     findings = [{"victim": "test_a.py::test_x",
                  "polluters": ["test_a.py::test_y"],
@@ -96,10 +291,52 @@ def test_sarif_valid_structure():
     r = sarif["runs"][0]["results"][0]
     assert r["ruleId"] == "test-pollution"
     assert r["level"] == "error"
-    assert "test_x" in r["message"]["text"]
+    assert r["message"]["text"] == "test_a.py::test_x polluted by test_a.py::test_y"
+
+
+def test_sarif_written_as_json(tmp_path):
+    import flakyfence
+    path = str(tmp_path / "report.sarif")
+    sarif = to_sarif([{"victim": "v", "polluters": ["p"], "state_changes": []}])
+    flakyfence._dump(sarif, path)
+    with open(path) as f:
+        assert json.load(f) == sarif
+
+
+def test_sarif_written_without_orjson(tmp_path, monkeypatch):
+    import importlib.util
+    import flakyfence
+    monkeypatch.setitem(sys.modules, "orjson", None)   # makes "import orjson" fail
+    spec = importlib.util.spec_from_file_location("_flakyfence_no_orjson", flakyfence.__file__)
+    stdlib_only = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(stdlib_only)
+    assert stdlib_only._loads is json.loads
+    path = str(tmp_path / "report.sarif")
+    sarif = to_sarif([{"victim": "v", "polluters": ["p"], "state_changes": []}])
+    stdlib_only._dump(sarif, path)
+    with open(path) as f:
+        assert json.load(f) == sarif
 
 
 def test_sarif_empty_results():
     sarif = to_sarif([])
     assert sarif["runs"][0]["results"] == []
     assert sarif["version"] == "2.1.0"
+
+
+def test_bisect_parallel_matches_serial():
+    suspects = [f"t{i}" for i in range(16)]
+    runner = lambda tests: "t5" not in tests
+    assert bisect_polluter("victim", suspects, runner=runner, parallel=True) == ["t5"]
+
+
+def test_default_runner_memoizes_sequences(monkeypatch):
+    import flakyfence
+    calls = []
+    monkeypatch.setattr(flakyfence, "_run_cache", {})
+    monkeypatch.setattr(flakyfence, "run_sequence",
+                        lambda tests, project=".": calls.append(tests) or "p" not in tests)
+    assert bisect_polluter("v", ["a", "p"]) == ["p"]
+    first = len(calls)
+    assert bisect_polluter("v", ["a", "p"]) == ["p"]
+    assert len(calls) == first